@@ -1,28 +1,93 @@
 
 # ─── Meal Suggestion Logic ───
-import random
-
-def suggest_meal(df, targets, trials=2000, portion_sizes=[0.5, 1.0, 1.5], max_items=3):
-    def score(meal, targets):
-        return sum(abs(meal[m].sum() - targets[m]) / (targets[m] + 1e-6) for m in targets)
-
-    best_score = float('inf')
-    best_combo = None
-
-    for _ in range(trials):
-        sampled = df.sample(n=random.randint(2, max_items))
-        portions = np.random.choice(portion_sizes, size=len(sampled))
-        meal = sampled.copy()
-        meal["Quantity"] = portions
-        meal["Calories"] = meal["Calories (kcal)"] * portions
-        meal["Protein"] = meal["Protein (g)"] * portions
-        meal["Carbs"] = meal["Carbs (g)"] * portions
-        meal["Fats"] = meal["Fats (g)"] * portions
-        s = score(meal, targets)
-        if s < best_score:
-            best_score = s
-            best_combo = meal
-    return best_combo
+import numpy as np
+
+_RNG = np.random.default_rng()
+
+# Column order of the macro array and of the targets passed to the search kernels
+MACRO_KEYS = ("Calories", "Protein", "Carbs", "Fats")
+
+try:
+    from numba import njit
+except ModuleNotFoundError:
+    njit = None
+
+if njit is not None:
+    # Serial on purpose: Streamlit runs the script off the main thread, and a parallel=True
+    # kernel launched from there leaves the threading layer unable to shut down on exit.
+    # A few thousand trials take well under a millisecond compiled, so threads buy nothing.
+    @njit(cache=True, fastmath=True, boundscheck=False, error_model="numpy")
+    def _search(macros, tgt, inv_tgt, trials, portion_sizes, max_items, seed):
+        np.random.seed(seed)
+        k = np.empty(trials, np.int64)
+        idx = np.zeros((trials, max_items), np.int64)
+        portions = np.zeros((trials, max_items), np.float32)
+        scores = np.empty(trials, np.float32)
+
+        for t in range(trials):
+            k[t] = np.random.randint(2, max_items + 1)
+            local_sum = np.zeros(4, np.float32)
+            for j in range(k[t]):
+                # Distinct foods per meal, like the original df.sample: redraw on a repeat
+                r = np.random.randint(0, macros.shape[0])
+                while r in idx[t, :j]:
+                    r = np.random.randint(0, macros.shape[0])
+                p = portion_sizes[np.random.randint(0, portion_sizes.shape[0])]
+                idx[t, j] = r
+                portions[t, j] = p
+                for m in range(4):
+                    local_sum[m] += macros[r, m] * p
+            s = 0.0
+            for m in range(4):
+                s += abs(local_sum[m] - tgt[m]) * inv_tgt[m]
+            scores[t] = s
+        return scores, idx, portions, k
+else:
+    _search = None
+
+def suggest_meal(macros, df_names, targets, trials=2000, portion_sizes=[0.5, 1.0, 1.5], max_items=3):
+    # macros is the (N, 4) float32 array from load_macros_soa(); df_names holds the matching food names
+    tgt = np.array([targets[m] for m in MACRO_KEYS], dtype=np.float32)
+    inv_tgt = (1.0 / (tgt + 1e-6)).astype(np.float32)
+    # Items are drawn without replacement, so a meal can't have more items than there are foods
+    max_items = min(max_items, macros.shape[0])
+
+    if _search is not None:
+        seed = _RNG.integers(0, 2**31 - 1)
+        scores, idx, portions, k = _search(
+            macros, tgt, inv_tgt, trials, np.asarray(portion_sizes, dtype=np.float32), max_items, seed
+        )
+    else:
+        # Draw every trial at once; slots past each trial's item count get a zero portion
+        k = _RNG.integers(2, max_items + 1, size=trials)
+        mask = np.arange(max_items) < k[:, None]
+        idx = _RNG.integers(0, macros.shape[0], size=(trials, max_items))
+        # Distinct foods per meal, like the original df.sample: redraw trials with a repeat in their
+        # first k slots (unused slots get distinct negative fillers so they never count as repeats)
+        filler = -1 - np.arange(max_items)
+        while True:
+            live = np.sort(np.where(mask, idx, filler), axis=1)
+            dup = (live[:, 1:] == live[:, :-1]).any(axis=1)
+            if not dup.any():
+                break
+            idx[dup] = _RNG.integers(0, macros.shape[0], size=(dup.sum(), max_items))
+        portions = _RNG.choice(portion_sizes, size=(trials, max_items)).astype(np.float32) * mask
+
+        sums = (macros[idx] * portions[..., None]).sum(axis=1)
+        scores = (np.abs(sums - tgt) * inv_tgt).sum(axis=1)
+    best = scores.argmin()
+
+    # Only the winning combo is materialized as a DataFrame
+    chosen = idx[best, :k[best]]
+    qty = portions[best, :k[best]]
+    return pd.DataFrame({
+        "Food Item": np.asarray(df_names)[chosen],
+        "Quantity": qty,
+        "Calories": macros[chosen, 0] * qty,
+        "Protein": macros[chosen, 1] * qty,
+        "Carbs": macros[chosen, 2] * qty,
+        "Fats": macros[chosen, 3] * qty
+    })
 
 
 # Final version of app.py for Nutrition Tracker with macronutrient targets and visual feedback
@@ -33,12 +98,13 @@ try:
     import streamlit as st
     import pandas as pd
     import plotly.graph_objects as go
+    import pyarrow as pa
     from datetime import datetime
     import os
-    from collections import defaultdict
 except ModuleNotFoundError as e:
     print("\n[ERROR] Required module not found:", e)
     print("Please install the missing package(s) using: pip install streamlit pandas plotly")
+    print("Optional, for faster meal suggestions: pip install numba")
     exit()
 
 # ─── Session State Setup ───
@@ -62,9 +128,52 @@ food_file = "calorie_calculator.csv"
 def load_data():
     df = pd.read_csv(food_file)
     columns = ['Food Item', 'Serving Size', 'Calories (kcal)', 'Protein (g)', 'Carbs (g)', 'Fats (g)', 'Quantity']
-    return df[columns].dropna(subset=["Food Item"]).reset_index(drop=True)
+    df = df[columns].dropna(subset=["Food Item"]).reset_index(drop=True)
+    # Per-item lookup so the quantity loop doesn't rescan the whole table for every selection.
+    # Built before the downcast below so logged values keep full float precision.
+    food_lookup = df.drop_duplicates(subset="Food Item").set_index("Food Item")[columns[1:]].to_dict(orient="index")
+
+    df["Food Item"] = df["Food Item"].astype("category")
+    df["Serving Size"] = df["Serving Size"].astype("category")
+    df[columns[2:]] = df[columns[2:]].astype("float32")
+    return df, food_lookup
 
-df = load_data()
+_, food_lookup = load_data()
+
+@st.cache_data
+def food_item_choices():
+    # File order, as before; .cat.categories would be free but comes back sorted
+    df, _ = load_data()
+    return df["Food Item"].unique().tolist()
+
+@st.cache_data
+def load_macros_soa():
+    # Contiguous (N, 4) float32 macro block for suggest_meal, extracted once per session
+    df, _ = load_data()
+    return np.ascontiguousarray(df[["Calories (kcal)", "Protein (g)", "Carbs (g)", "Fats (g)"]].to_numpy(dtype=np.float32))
+
+# ─── Load Meal Log ───
+@st.cache_data(max_entries=1)
+def load_log(mtime):
+    # mtime is only the cache key: reruns re-read the file only after it changes.
+    # Text columns are pinned to strings so numeric tags or an all-empty column aren't inferred as int/null.
+    text = pd.ArrowDtype(pa.string())
+    return pd.read_csv(
+        log_file, engine="pyarrow", dtype_backend="pyarrow",
+        dtype={"Food Item": text, "Timestamp": text, "Meal Tag": text}
+    ).fillna({"Meal Tag": ""})
+
+# ─── Macro Pie Chart ───
+@st.cache_data
+def make_pie(p, c, f, kcal):
+    # Returned as a dict so Streamlit can cache it; unchanged meals skip figure construction on reruns
+    return go.Figure(data=[go.Pie(
+        labels=[f"Protein ({p:.1f}g)", f"Carbs ({c:.1f}g)", f"Fats ({f:.1f}g)"],
+        values=[p*4, c*4, f*9],
+        textinfo="label+percent",
+        hoverinfo="label+value+percent",
+        hole=0.3
+    )]).update_layout(title=f"Total: {int(kcal)} kcal").to_dict()
 
 # ─── Sidebar ───
 with st.sidebar:
@@ -97,17 +206,17 @@ if st.button("🔄 Reset Selection"):
 # ─── Meal Selection ───
 if st.session_state.reset_trigger:
     meal_tag = st.text_input("📝 Meal Tag", value="", key="tag_reset")
-    selected_items = st.multiselect("Select food items:", df["Food Item"].unique(), default=[], key="select_reset")
+    selected_items = st.multiselect("Select food items:", food_item_choices(), default=[], key="select_reset")
     st.session_state.reset_trigger = False
 else:
     meal_tag = st.text_input("📝 Meal Tag", key="tag")
-    selected_items = st.multiselect("Select food items:", df["Food Item"].unique(), key="select")
+    selected_items = st.multiselect("Select food items:", food_item_choices(), key="select")
 
 results = []
 if selected_items:
     st.write("### 🍽️ Set Quantities")
     for item in selected_items:
-        row = df[df["Food Item"] == item].iloc[0]
+        row = food_lookup[item]
         st.markdown(f"**{item}** — *{row['Serving Size']}*")
         qty = st.number_input(
             f"Quantity for {item}", min_value=0.0, step=0.1, value=float(row["Quantity"]), key=item
@@ -115,104 +224,101 @@ if selected_items:
         results.append({
             "Food Item": item,
             "Quantity": qty,
-            "Calories": round(row["Calories (kcal)"] * qty, 2),
-            "Protein": round(row["Protein (g)"] * qty, 2),
-            "Carbs": round(row["Carbs (g)"] * qty, 2),
-            "Fats": round(row["Fats (g)"] * qty, 2)
+            "Calories": row["Calories (kcal)"] * qty,
+            "Protein": row["Protein (g)"] * qty,
+            "Carbs": row["Carbs (g)"] * qty,
+            "Fats": row["Fats (g)"] * qty
         })
 
 # ─── Summary + Save ───
+def save_meal(df_summary, total, meal_tag):
+    # Runs as the save button's on_click callback, i.e. before the next run renders any widget,
+    # so clearing the selection and tag here takes effect in that same run
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    tag = meal_tag if meal_tag else "Untitled"
+
+    meal_data = df_summary[df_summary["Food Item"] != "Total"].assign(**{"Timestamp": "", "Meal Tag": ""})
+
+    summary_row = {
+        "Food Item": "Meal Logged",
+        "Quantity": "",
+        "Calories": total["Calories"],
+        "Protein": total["Protein"],
+        "Carbs": total["Carbs"],
+        "Fats": total["Fats"],
+        "Timestamp": timestamp,
+        "Meal Tag": tag
+    }
+
+    divider_row = {k: "" for k in summary_row}
+    divider_row["Food Item"] = "---"
+
+    log_df = pd.concat([meal_data, pd.DataFrame([summary_row, divider_row])], ignore_index=True)
+
+    # Append only the new rows; the header is written once when the log is new or empty
+    header = not os.path.exists(log_file) or os.path.getsize(log_file) == 0
+    log_df.to_csv(log_file, mode="a", header=header, index=False)
+    st.session_state.meal_saved = True
+    st.session_state.select = []
+    st.session_state.tag = ""
+
+if st.session_state.pop("meal_saved", False):
+    st.success("Meal saved to log!")
+
 if results:
     df_summary = pd.DataFrame(results)
-    total = df_summary[["Calories", "Protein", "Carbs", "Fats"]].sum()
+    total = df_summary[["Calories", "Protein", "Carbs", "Fats"]].sum().to_dict()
     total["Food Item"] = "Total"
     total["Quantity"] = ""
-    df_summary = pd.concat([df_summary, pd.DataFrame([total])], ignore_index=True)
+    df_summary.loc[len(df_summary)] = total
 
     st.write("### 📊 Nutrition Summary")
-    st.dataframe(df_summary, use_container_width=True)
+    st.dataframe(df_summary.round(2), use_container_width=True)
 
-    prot_kcal = total["Protein"] * 4
-    carb_kcal = total["Carbs"] * 4
-    fat_kcal = total["Fats"] * 9
-    total_kcal = prot_kcal + carb_kcal + fat_kcal
+    total_kcal = total["Protein"] * 4 + total["Carbs"] * 4 + total["Fats"] * 9
 
     st.markdown("### 🥧 Macronutrient Breakdown")
-    fig = go.Figure(data=[go.Pie(
-        labels=[
-            f"Protein ({total['Protein']:.1f}g)",
-            f"Carbs ({total['Carbs']:.1f}g)",
-            f"Fats ({total['Fats']:.1f}g)"
-        ],
-        values=[prot_kcal, carb_kcal, fat_kcal],
-        textinfo="label+percent",
-        hoverinfo="label+value+percent",
-        hole=0.3
-    )])
-    fig.update_layout(title=f"Total: {int(total_kcal)} kcal")
-    st.plotly_chart(fig, use_container_width=True)
-
-    if st.button("✅ Save Meal to Log"):
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        tag = meal_tag if meal_tag else "Untitled"
-
-        meal_data = df_summary[df_summary["Food Item"] != "Total"].copy()
-        meal_data["Timestamp"] = ""
-        meal_data["Meal Tag"] = ""
-
-        summary_row = {
-            "Food Item": "Meal Logged",
-            "Quantity": "",
-            "Calories": total["Calories"],
-            "Protein": total["Protein"],
-            "Carbs": total["Carbs"],
-            "Fats": total["Fats"],
-            "Timestamp": timestamp,
-            "Meal Tag": tag
-        }
-
-        divider_row = {k: "" for k in summary_row}
-        divider_row["Food Item"] = "---"
-
-        log_df = pd.concat([
-            meal_data,
-            pd.DataFrame([summary_row]),
-            pd.DataFrame([divider_row])
-        ], ignore_index=True)
-
-        if os.path.exists(log_file) and os.path.getsize(log_file) > 0:
-            try:
-                existing = pd.read_csv(log_file)
-                full_log = pd.concat([existing, log_df], ignore_index=True)
-            except pd.errors.EmptyDataError:
-                full_log = log_df
-        else:
-            full_log = log_df
-
-        full_log.to_csv(log_file, index=False)
-        st.success("Meal saved to log!")
-        st.session_state.reset_trigger = True
-        st.rerun()
+    st.plotly_chart(
+        make_pie(round(total["Protein"], 1), round(total["Carbs"], 1), round(total["Fats"], 1), int(total_kcal)),
+        use_container_width=True
+    )
+
+    st.button("✅ Save Meal to Log", on_click=save_meal, args=(df_summary, total, meal_tag))
 
 # ─── Preview Log with Day-wise Grouping ───
-st.markdown("### 📖 Meal Log Preview (Grouped by Day)")
+@st.cache_data(max_entries=1)
+def group_meals(mtime):
+    log_df = load_log(mtime)
+    if log_df.empty:
+        return log_df, pd.DataFrame(), {}
+
+    # Every "Meal Logged"/"---" row closes a group, so a meal's items share GroupId - 1 of its summary row
+    markers = log_df["Food Item"].isin(["Meal Logged", "---"])
+    group_id = markers.cumsum()
+    items = log_df[~markers]
+    macros_per_meal = items[["Protein", "Carbs", "Fats"]].astype(float).groupby(group_id[~markers]).sum()
 
-if os.path.exists(log_file) and os.path.getsize(log_file) > 0:
-    log_df = pd.read_csv(log_file).fillna("")
     meals = log_df[log_df["Food Item"] == "Meal Logged"]
-    day_groups = defaultdict(list)
+    meal_macros = macros_per_meal.reindex(group_id[meals.index] - 1, fill_value=0.0).set_axis(meals.index)
+    days = pd.to_datetime(meals["Timestamp"], format="%Y-%m-%d %H:%M:%S").dt.date
+    day_groups = dict(meals.groupby(days, sort=False).groups)
+    return meals, meal_macros, day_groups
 
-    for i in meals.index:
-        day = log_df.loc[i, "Timestamp"].split()[0]
-        day_groups[day].append(i)
+def color_macro(actual, target):
+    if actual >= 1.1 * target:
+        return "red"
+    elif actual >= 0.9 * target:
+        return "green"
+    else:
+        return "orange"
 
-    def color_macro(actual, target):
-        if actual >= 1.1 * target:
-            return "red"
-        elif actual >= 0.9 * target:
-            return "green"
-        else:
-            return "orange"
+def show_log_preview():
+    st.markdown("### 📖 Meal Log Preview (Grouped by Day)")
+
+    if not (os.path.exists(log_file) and os.path.getsize(log_file) > 0):
+        return
+
+    meals, meal_macros, day_groups = group_meals(os.path.getmtime(log_file))
 
     for day, indices in day_groups.items():
         st.markdown(f"## 📅 {day}")
@@ -222,18 +328,11 @@ if os.path.exists(log_file) and os.path.getsize(log_file) > 0:
         daily_p = daily_c = daily_f = daily_kcal = 0
 
         for i in indices:
-            meal_row = log_df.loc[i]
+            meal_row = meals.loc[i]
             tag = meal_row["Meal Tag"]
             ts = meal_row["Timestamp"]
 
-            start = i - 1
-            while start >= 0 and log_df.loc[start, "Food Item"] not in ["Meal Logged", "---"]:
-                start -= 1
-            data = log_df.iloc[start+1:i]
-
-            p = data["Protein"].sum()
-            c = data["Carbs"].sum()
-            f = data["Fats"].sum()
+            p, c, f = meal_macros.loc[i]
             kcal = p*4 + c*4 + f*9
 
             daily_p += p
@@ -241,31 +340,28 @@ if os.path.exists(log_file) and os.path.getsize(log_file) > 0:
             daily_f += f
             daily_kcal += kcal
 
-            pie = go.Figure(data=[go.Pie(
-                labels=[f"Protein ({p:.1f}g)", f"Carbs ({c:.1f}g)", f"Fats ({f:.1f}g)"],
-                values=[p*4, c*4, f*9],
-                textinfo="label+percent",
-                hole=0.3
-            )])
-            pie.update_layout(title=f"Total: {int(kcal)} kcal")
+            pie = make_pie(round(p, 1), round(c, 1), round(f, 1), int(kcal))
 
             with cols[col_idx]:
-                st.plotly_chart(pie, use_container_width=True)
+                st.plotly_chart(pie, use_container_width=True, key=f"meal_pie_{i}")
                 st.markdown(f"**🕒 {ts}** | 🏷️ **{tag}**")
             col_idx = (col_idx + 1) % 2
 
         st.markdown("#### 📊 Daily Totals vs Targets")
-        for macro, actual, target in zip(
-            ["Calories", "Protein", "Carbs", "Fats"],
-            [daily_kcal, daily_p, daily_c, daily_f],
-            [st.session_state.targets["Calories"], st.session_state.targets["Protein"], st.session_state.targets["Carbs"], st.session_state.targets["Fats"]]
-        ):
-            color = color_macro(actual, target)
-            st.markdown(
-                f"**{macro}:** {actual:.1f} / {target}  ➜  <span style='color:{color}'>Remaining: {max(0, target - actual):.1f}</span>",
-                unsafe_allow_html=True
+        # One HTML table per day instead of a markdown + progress element per macro
+        rows = [
+            f"<tr><td><b>{macro}:</b> {actual:.1f} / {target}</td>"
+            f"<td style='color:{color_macro(actual, target)}'>Remaining: {max(0, target - actual):.1f}</td>"
+            f"<td style='width:50%'><div style='background:rgba(151,166,195,0.25);border-radius:4px'>"
+            f"<div style='width:{min(actual / target, 1.0) * 100:.1f}%;height:8px;background:#ff4b4b;border-radius:4px'></div>"
+            f"</div></td></tr>"
+            for macro, actual, target in zip(
+                ["Calories", "Protein", "Carbs", "Fats"],
+                [daily_kcal, daily_p, daily_c, daily_f],
+                [st.session_state.targets["Calories"], st.session_state.targets["Protein"], st.session_state.targets["Carbs"], st.session_state.targets["Fats"]]
             )
-            pct = min(actual / target, 1.0)
-            st.progress(pct)
+        ]
+        st.markdown("<table style='width:100%'>" + "".join(rows) + "</table>", unsafe_allow_html=True)
         st.markdown("---")
 
+show_log_preview()